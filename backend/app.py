@@ -38,7 +38,7 @@ def initialize_app():
         data_fetcher = ImprovedDataFetcher()
         investment_engine = ImprovedInvestmentEngine(data_fetcher)
         risk_manager = RiskManager(data_fetcher)
-        portfolio_manager = PortfolioManager()
+        portfolio_manager = PortfolioManager(data_fetcher=data_fetcher)
         
         logger.info("應用初始化成功")
         
@@ -4,6 +4,7 @@
 """
 
 from flask import jsonify, request
+from collections import Counter
 from datetime import datetime
 import logging
 
@@ -66,6 +67,9 @@ def add_daily_recommendation_routes(app, data_fetcher, investment_engine, risk_m
             except Exception as e:
                 logger.warning(f"風險評估失敗: {e}")
             
+            # 單次走訪統計各訊號數量
+            signal_counts = Counter(rec.get('signal') for rec in recommendations)
+            
             # 構建響應
             response_data = {
                 'success': True,
@@ -80,8 +84,8 @@ def add_daily_recommendation_routes(app, data_fetcher, investment_engine, risk_m
                 },
                 'summary': {
                     'total_etfs': len(recommendations),
-                    'green_signals': len([r for r in recommendations if r.get('signal') == 'green']),
-                    'yellow_signals': len([r for r in recommendations if r.get('signal') == 'yellow']),
+                    'green_signals': signal_counts['green'],
+                    'yellow_signals': signal_counts['yellow'],
                     'expected_return': advice.get('expected_return', 0.08)
                 }
             }
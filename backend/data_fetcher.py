@@ -1,54 +1,274 @@
-import yfinance as yf
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import json
 import logging
+import os
+import pickle
+import random
+import sqlite3
+import tempfile
+import threading
 import time
-from typing import Dict, List, Optional
+from bisect import bisect_left
+from functools import lru_cache, partial
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+from scipy.signal import lfilter
+
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=32)
+def _ema_weight_total(span: int, length: int) -> np.ndarray:
+    """EMA各期權重總和（等比級數），各ETF長度相同時重複使用"""
+    decay = 1 - 2 / (span + 1)
+    weight_total = (1 - decay ** np.arange(1, length + 1)) / (1 - decay)
+    weight_total.flags.writeable = False
+    return weight_total
+
+def _ema(values: np.ndarray, span: int) -> np.ndarray:
+    """計算指數移動平均（等同 ewm(span=span, min_periods=1).mean()）；遞迴會將NaN帶到之後每一期，輸入須不含NaN"""
+    decay = 1 - 2 / (span + 1)
+    # 單次遞迴累加加權和，就地除以權重總和避免額外配置
+    weighted_sum = lfilter([1.0], [1.0, -decay], values)
+    weighted_sum /= _ema_weight_total(span, len(values))
+    return weighted_sum
+
+def _annualized_volatility(close: np.ndarray) -> float:
+    """計算年化波動率"""
+    returns = close[1:] / close[:-1] - 1
+    return float(returns.std(ddof=1) * (252**0.5)) if returns.size > 1 else 0.0
+
+class TokenBucket:
+    """令牌桶限流器"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate  # 每秒補充的令牌數
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last_refill = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """取得一個令牌，不足時等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                
+                wait_time = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            
+            time.sleep(wait_time)
+    
+    def is_paused(self) -> bool:
+        """是否處於伺服器要求的退避期間"""
+        return time.monotonic() < self.blocked_until
+    
+    def pause(self, seconds: float):
+        """暫停發放令牌（伺服器要求退避時）"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+class PersistentCache:
+    """以SQLite保存的TTL緩存，進程重啟後仍可使用"""
+    
+    def __init__(self, path: str, ttl: int):
+        self.path = path
+        self.ttl = ttl
+        self.local = threading.local()  # 每個執行緒重用自己的連線
+        
+        try:
+            conn = self._connect()
+            with conn:
+                # WAL模式下讀取不會被寫入阻塞
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache "
+                    "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+                )
+                # 啟動時清掉已過期的資料，避免檔案無限增長
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        except Exception as e:
+            logger.error(f"Error initializing persistent cache: {e}")
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            # WAL模式下NORMAL已可保證一致性，省去每次提交的fsync
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+    
+    def get(self, key: str):
+        """讀取未過期的緩存值"""
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+            return pickle.loads(row[0]) if row else None
+        except Exception as e:
+            logger.warning(f"Error reading persistent cache for {key}: {e}")
+            return None
+    
+    def set(self, key: str, value):
+        """寫入緩存值"""
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + self.ttl)
+                )
+        except Exception as e:
+            logger.warning(f"Error writing persistent cache for {key}: {e}")
+    
+    def clear(self):
+        """清除所有緩存"""
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM cache")
+        except Exception as e:
+            logger.warning(f"Error clearing persistent cache: {e}")
+
+STATIC_INFO_FIELDS = ('trailingPE', 'dividendYield', 'totalAssets', 'expenseRatio')  # 使用到的ticker.info欄位
+THROTTLE_BACKOFF = 5  # 被限流且無Retry-After時的退避秒數
+RATE_LIMIT_RETRIES = 3  # 被限流時的重試次數
+RATE_LIMIT_BUDGET = 12  # 單次獲取可用於限流重試的秒數上限
+BATCH_RETRY_DEADLINE = 60  # 批量獲取的重試期限，需遠低於gunicorn的120秒逾時
+
+# 大盤趨勢查表 - 漲跌幅超過各門檻（不含）即進入下一級
+TREND_CHANGE_BOUNDS = (-1, 0, 1)
+TRENDS = (
+    ('down', '下跌趨勢'),
+    ('sideways', '橫盤整理'),
+    ('up', '溫和上漲'),
+    ('strong_up', '強勢上漲')
+)
+
+def _is_rate_limited(error: Exception) -> bool:
+    """判斷例外是否為上游限流"""
+    message = str(error)
+    return '429' in message or 'Too Many' in message or 'Rate limit' in message
+
+def _on_response(response, *args, **kwargs):
+    """根據回應調整限流"""
+    retry_after = response.headers.get('Retry-After')
+    
+    if response.status_code == 429 or retry_after:
+        try:
+            delay = float(retry_after)
+        except (TypeError, ValueError):
+            delay = THROTTLE_BACKOFF
+        
+        logger.warning(f"Throttled by {response.url}, pausing requests for {delay:.1f}s")
+        _rate_limiter.pause(delay)
+    
+    return response
+
+# 清理後的ETF清單 - 移除重複和無效項目
+ETF_LIST = {
+    'large_cap': {
+        '0050': '元大台灣50',
+        '006208': '富邦台50'
+    },
+    'dividend': {
+        '0056': '元大高股息',
+        '00878': '國泰永續高股息',
+        '00713': '元大台灣高息低波'
+    },
+    'tech': {
+        '0052': '富邦科技',
+        '00881': '國泰台灣5G+'
+    },
+    'mid_small': {
+        '0051': '元大中型100',
+        '00762': '元大全球AI'
+    },
+    'bond': {
+        '00679B': '元大美債20年',
+        '00687B': '國泰20年美債'
+    },
+    'reit': {
+        '00712': '復華富時不動產',
+        '01001': '元大台灣ESG永續'
+    }
+}
+
+# 代碼索引 - O(1)查詢名稱與分類
+ETF_INDEX = {
+    symbol: {'name': name, 'category': category_name, 'cache_key': f"etf_{symbol}"}
+    for category_name, etfs in ETF_LIST.items()
+    for symbol, name in etfs.items()
+}
+
+# 全進程共用的限流器與HTTP連線池，所有實例共享連線、cookie與限流狀態
+_rate_limiter = TokenBucket(rate=2.0, capacity=5)
+_session = requests.Session()
+# 伺服器暫時性錯誤（5xx）在連線層重試；429交由令牌桶退避處理
+_session.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504), raise_on_status=False)
+))
+_session.hooks['response'].append(_on_response)
+# 全進程共用的常駐執行緒池，各實例共用，避免每建立一個獲取器就多一組執行緒
+MAX_WORKERS = 8
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+
 class ImprovedDataFetcher:
     """升級後的數據獲取器"""
     
-    def __init__(self):
-        # 清理後的ETF清單 - 移除重複和無效項目
-        self.etf_list = {
-            'large_cap': {
-                '0050': '元大台灣50',
-                '006208': '富邦台50'
-            },
-            'dividend': {
-                '0056': '元大高股息',
-                '00878': '國泰永續高股息',
-                '00713': '元大台灣高息低波'
-            },
-            'tech': {
-                '0052': '富邦科技',
-                '00881': '國泰台灣5G+'
-            },
-            'mid_small': {
-                '0051': '元大中型100',
-                '00762': '元大全球AI'
-            },
-            'bond': {
-                '00679B': '元大美債20年',
-                '00687B': '國泰20年美債'
-            },
-            'reit': {
-                '00712': '復華富時不動產',
-                '01001': '元大台灣ESG永續'
-            }
-        }
+    def __init__(self, static_info_file: str = "etf_static_info.json", cache_file: str = "etf_cache.db"):
+        # ETF清單與代碼索引為模組層級常數，各實例共用
+        self.etf_list = ETF_LIST
+        self.etf_index = ETF_INDEX
         
         # 數據緩存
         self.cache = {}
+        self.cache_expires = {}  # 各key的到期時間戳，讀取時免鎖比對
         self.cache_ttl = 300  # 5分鐘緩存
+        self.persistent_cache = PersistentCache(cache_file, self.cache_ttl)
+        self.cache_locks = tuple(threading.Lock() for _ in range(16))  # 依key分片，不同ETF互不阻塞
+        self.inflight = {}  # 進行中的請求
         
         # 請求限制
         self.last_request_time = {}
         self.min_request_interval = 1  # 最小請求間隔1秒
+        self.rate_limiter = _rate_limiter
+        self.executor = _executor  # 供批量獲取與靜態資訊並行請求
+        
+        # 共用HTTP連線池 - 所有Yahoo請求重用keep-alive連線
+        self.session = _session
+        self.tickers = {}  # 重用的Ticker物件（僅用於歷史數據）
+        
+        # ETF靜態資訊（規模、費用率等）超過一天即於背景更新，避免每次請求ticker.info
+        # 於建構時載入，避免執行緒池中的多個執行緒同時首次載入而遺失更新
+        self.static_info_file = static_info_file
+        self.static_info = self._load_static_info()
+        self.static_info_ttl = 86400
+        self.static_info_lock = threading.Lock()
+        self.static_info_dirty = False  # 是否有尚未寫入檔案的更新
+        self.info_refreshing = set()  # 背景更新中的代碼
+        self.info_refresh_attempts = {}  # 各代碼最近一次背景更新的時間
+        self.info_retry_interval = 600  # 背景更新失敗後至少間隔10分鐘再重試
     
     def get_etf_list(self) -> Dict:
         """獲取ETF清單"""
@@ -57,11 +277,50 @@ class ImprovedDataFetcher:
     def fetch_etf_data(self, symbol: str) -> Optional[Dict]:
         """獲取ETF數據"""
         # 檢查緩存
-        cache_key = f"etf_{symbol}"
-        if self._is_cache_valid(cache_key):
+        cache_key = self._cache_key(symbol)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
             logger.info(f"Using cached data for {symbol}")
-            return self.cache[cache_key]
+            return cached
         
+        return self._fetch_coalesced(cache_key, lambda: self._fetch_fresh_etf_data(symbol, cache_key))
+    
+    def _fetch_coalesced(self, cache_key: str, fetch: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+        """合併同一key的並發請求，只由第一個請求向上游獲取，其餘等待共用結果"""
+        future, is_owner = self._claim_inflight(cache_key)
+        if not is_owner:
+            logger.info(f"Waiting for in-flight fetch of {cache_key}")
+            return future.result()
+        
+        return self._run_inflight(cache_key, future, fetch)
+    
+    def _claim_inflight(self, cache_key: str) -> Tuple[Future, bool]:
+        """登記進行中的請求，返回共用的Future及是否由本次請求負責獲取"""
+        with self._lock_for(cache_key):
+            future = self.inflight.get(cache_key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self.inflight[cache_key] = future
+            return future, True
+    
+    def _run_inflight(self, cache_key: str, future: Future, fetch: Callable[[], Optional[Dict]]) -> Optional[Dict]:
+        """執行已登記的請求並發布結果；登記前可能已有其他請求完成，先重新檢查緩存"""
+        try:
+            result = self._get_cached(cache_key)
+            if result is None:
+                result = fetch()
+            future.set_result(result)
+            return result
+        finally:
+            if not future.done():
+                future.set_result(None)
+            with self._lock_for(cache_key):
+                self.inflight.pop(cache_key, None)
+    
+    def _fetch_fresh_etf_data(self, symbol: str, cache_key: str, batch: bool = False,
+                              deadline: Optional[float] = None) -> Optional[Dict]:
+        """向上游獲取ETF數據並更新緩存（批量獲取時於執行緒池內執行，基本信息在同一執行緒取得，由呼叫端統一寫檔）"""
         # 限制請求頻率
         self._rate_limit(symbol)
         
@@ -69,19 +328,15 @@ class ImprovedDataFetcher:
             logger.info(f"Fetching fresh data for {symbol}")
             
             # 使用yfinance獲取數據
-            ticker_symbol = f"{symbol}.TW"
-            ticker = yf.Ticker(ticker_symbol)
+            ticker = self._get_ticker(f"{symbol}.TW")
             
-            # 獲取基本信息
-            try:
-                info = ticker.info
-            except Exception as e:
-                logger.warning(f"Could not fetch info for {symbol}: {e}")
-                info = {}
+            # 基本信息與歷史數據互不依賴，背景獲取基本信息；執行緒池內不再等待池中其他任務
+            info_future = None if batch else self.executor.submit(self._fetch_info, symbol)
             
             # 獲取歷史數據
             try:
-                hist = ticker.history(period="1y", interval="1d")
+                # 不需要除權息/分割事件欄位
+                hist = self._history_with_retry(ticker, symbol, deadline, period="1y", interval="1d", actions=False)
                 if hist.empty:
                     logger.warning(f"No historical data for {symbol}")
                     return None
@@ -89,43 +344,11 @@ class ImprovedDataFetcher:
                 logger.error(f"Error fetching historical data for {symbol}: {e}")
                 return None
             
-            # 計算技術指標
-            technical_data = self._calculate_technical_indicators(hist)
-            
-            # 獲取ETF名稱
-            etf_name = self._get_etf_name(symbol)
-            
-            # 構建數據結構
-            etf_data = {
-                'symbol': symbol,
-                'name': etf_name,
-                'current_price': float(hist['Close'].iloc[-1]),
-                'pe_ratio': info.get('trailingPE'),
-                'dividend_yield': info.get('dividendYield'),
-                'aum': info.get('totalAssets'),
-                'expense_ratio': info.get('expenseRatio'),
-                'avg_volume': float(hist['Volume'].tail(20).mean()),
-                'price_data': {
-                    'current_price': float(hist['Close'].iloc[-1]),
-                    'ma20': float(technical_data['MA20'].iloc[-1]) if not pd.isna(technical_data['MA20'].iloc[-1]) else None,
-                    'ma60': float(technical_data['MA60'].iloc[-1]) if not pd.isna(technical_data['MA60'].iloc[-1]) else None,
-                    'rsi': float(technical_data['RSI'].iloc[-1]) if not pd.isna(technical_data['RSI'].iloc[-1]) else None,
-                    'macd': float(technical_data['MACD'].iloc[-1]) if not pd.isna(technical_data['MACD'].iloc[-1]) else None,
-                    'macd_signal': float(technical_data['MACD_Signal'].iloc[-1]) if not pd.isna(technical_data['MACD_Signal'].iloc[-1]) else None,
-                    'volatility': float(hist['Close'].pct_change().std() * (252**0.5))
-                },
-                'performance': {
-                    '1d': float((hist['Close'].iloc[-1] / hist['Close'].iloc[-2] - 1) * 100) if len(hist) >= 2 else 0,
-                    '1w': float((hist['Close'].iloc[-1] / hist['Close'].iloc[-6] - 1) * 100) if len(hist) >= 6 else 0,
-                    '1m': float((hist['Close'].iloc[-1] / hist['Close'].iloc[-21] - 1) * 100) if len(hist) >= 21 else 0,
-                    '3m': float((hist['Close'].iloc[-1] / hist['Close'].iloc[-63] - 1) * 100) if len(hist) >= 63 else 0,
-                    '1y': float((hist['Close'].iloc[-1] / hist['Close'].iloc[0] - 1) * 100) if len(hist) >= 252 else 0
-                },
-                'last_updated': datetime.now()
-            }
+            info = self._fetch_info(symbol, save=False) if batch else info_future.result()
+            etf_data = self._build_etf_data(symbol, info, hist)
             
             # 更新緩存
-            self.cache[cache_key] = etf_data
+            self._set_cache(cache_key, etf_data)
             logger.info(f"Successfully fetched and cached data for {symbol}")
             
             return etf_data
@@ -134,89 +357,249 @@ class ImprovedDataFetcher:
             logger.error(f"Error fetching data for {symbol}: {e}")
             return None
     
+    def _get_ticker(self, ticker_symbol: str):
+        """取得共用session的Ticker物件，同一代碼重複使用"""
+        ticker = self.tickers.get(ticker_symbol)
+        if ticker is None:
+            import yfinance as yf
+            # 執行緒池中可能同時建立同一代碼，持鎖再檢查一次，只建立一個物件
+            with self._lock_for(ticker_symbol):
+                ticker = self.tickers.get(ticker_symbol)
+                if ticker is None:
+                    ticker = self.tickers[ticker_symbol] = yf.Ticker(ticker_symbol, session=self.session)
+        return ticker
+    
+    def _history_with_retry(self, ticker, symbol: str, deadline: Optional[float] = None, **kwargs) -> pd.DataFrame:
+        """獲取歷史數據，被限流時以3-5秒隨機抖動退避重試，等待不超過期限（monotonic時間）"""
+        if deadline is None:
+            deadline = time.monotonic() + RATE_LIMIT_BUDGET
+        
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            try:
+                hist, error = ticker.history(**kwargs), None
+            except Exception as e:
+                hist, error = None, e
+            
+            delay = random.uniform(3, 5)
+            can_retry = attempt < RATE_LIMIT_RETRIES and time.monotonic() + delay < deadline
+            
+            if error is not None:
+                if not can_retry or not _is_rate_limited(error):
+                    raise error
+            # history()預設不拋出錯誤，被限流時只返回空表；此時回應hook已暫停限流器
+            elif not hist.empty or not can_retry or not self.rate_limiter.is_paused():
+                return hist
+            
+            logger.warning(f"Rate limited fetching {symbol}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+            self.rate_limiter.acquire()
+    
+    def _fetch_info(self, symbol: str, force: bool = False, save: bool = True) -> Dict:
+        """獲取ETF基本信息（優先使用每日更新的靜態資訊）"""
+        entry = self.static_info.get(symbol)
+        if not force and entry:
+            # 過期的靜態資訊先照用並於背景更新，不阻塞當次請求
+            if time.time() - entry.get('updated_at', 0) >= self.static_info_ttl:
+                self._refresh_info_in_background(symbol)
+            return entry
+        
+        try:
+            import yfinance as yf
+            self.rate_limiter.acquire()
+            # Ticker會保留已取得的info，更新靜態資訊時需使用新的物件
+            info = yf.Ticker(f"{symbol}.TW", session=self.session).info
+        except Exception as e:
+            logger.warning(f"Could not fetch info for {symbol}: {e}")
+            return entry or {}
+        
+        entry = {field: info.get(field) for field in STATIC_INFO_FIELDS}
+        entry['updated_at'] = time.time()
+        
+        with self.static_info_lock:
+            self.static_info[symbol] = entry
+            self.static_info_dirty = True
+        
+        # 批量更新時由呼叫端在結束後統一寫檔
+        if save:
+            self._save_static_info()
+        
+        return entry
+    
+    def _refresh_info_in_background(self, symbol: str):
+        """於執行緒池背景更新單檔靜態資訊，同一代碼同時只更新一次，失敗後間隔一段時間再試"""
+        now = time.time()
+        with self.static_info_lock:
+            if symbol in self.info_refreshing or now - self.info_refresh_attempts.get(symbol, 0) < self.info_retry_interval:
+                return
+            self.info_refreshing.add(symbol)
+            self.info_refresh_attempts[symbol] = now
+        
+        def refresh():
+            try:
+                self._fetch_info(symbol, force=True)
+            finally:
+                with self.static_info_lock:
+                    self.info_refreshing.discard(symbol)
+        
+        self.executor.submit(refresh)
+    
+    def _load_static_info(self) -> Dict:
+        """載入ETF靜態資訊"""
+        try:
+            if os.path.exists(self.static_info_file):
+                with open(self.static_info_file, 'rb') as f:
+                    return _json_loads(f.read())
+            else:
+                return {}
+        except Exception as e:
+            logger.error(f"Error loading static info: {e}")
+            return {}
+    
+    def _save_static_info(self):
+        """保存ETF靜態資訊（寫入暫存檔後原子替換，避免並發寫入損壞檔案）"""
+        with self.static_info_lock:
+            if not self.static_info_dirty:
+                return
+            
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.static_info_file)), suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump(self.static_info, f, ensure_ascii=False, indent=2)
+                    os.replace(tmp_path, self.static_info_file)
+                except BaseException:
+                    os.remove(tmp_path)
+                    raise
+                self.static_info_dirty = False
+            except Exception as e:
+                logger.error(f"Error saving static info: {e}")
+    
+    def _build_etf_data(self, symbol: str, info: Dict, hist: pd.DataFrame) -> Dict:
+        """由基本信息與歷史數據構建ETF數據"""
+        # 只取用收盤價與成交量；去除缺值（含開頭的NaN），指標計算不需處理缺值
+        close = hist['Close'].dropna().to_numpy(dtype=np.float64)
+        volume = hist['Volume'].to_numpy(dtype=np.float64)
+        
+        # 計算技術指標
+        technical_data = self._calculate_technical_indicators(close)
+        
+        # 獲取ETF名稱
+        etf_name = self._get_etf_name(symbol)
+        
+        # 構建數據結構
+        return {
+            'symbol': symbol,
+            'name': etf_name,
+            'current_price': float(close[-1]),
+            'pe_ratio': info.get('trailingPE'),
+            'dividend_yield': info.get('dividendYield'),
+            'aum': info.get('totalAssets'),
+            'expense_ratio': info.get('expenseRatio'),
+            'avg_volume': float(np.nanmean(volume[-20:])),
+            'price_data': {
+                'current_price': float(close[-1]),
+                'ma20': technical_data.get('ma20'),
+                'ma60': technical_data.get('ma60'),
+                'rsi': technical_data.get('rsi'),
+                'macd': technical_data.get('macd'),
+                'macd_signal': technical_data.get('macd_signal'),
+                'volatility': technical_data['volatility']
+            },
+            'performance': technical_data['performance'],
+            'last_updated': datetime.now()
+        }
+    
     def _get_etf_name(self, symbol: str) -> str:
         """獲取ETF名稱"""
-        for category in self.etf_list.values():
-            if symbol in category:
-                return category[symbol]
-        return symbol
+        entry = self.etf_index.get(symbol)
+        return entry['name'] if entry else symbol
     
-    def _calculate_technical_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
-        """計算技術指標"""
+    def _calculate_technical_indicators(self, close: np.ndarray) -> Dict:
+        """單次計算最新一期技術指標、波動率與區間報酬"""
         try:
             # 確保數據不為空
-            if df.empty:
-                return df
+            if close.size == 0:
+                return {}
             
             # 移動平均線
-            df['MA20'] = df['Close'].rolling(window=20, min_periods=1).mean()
-            df['MA60'] = df['Close'].rolling(window=60, min_periods=1).mean()
+            ma20 = close[-20:].mean()
+            ma60 = close[-60:].mean()
             
-            # RSI
-            delta = df['Close'].diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14, min_periods=1).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14, min_periods=1).mean()
+            # RSI - 只需最後14個價差
+            delta = np.diff(close[-15:])
+            gain = np.maximum(delta, 0).mean() if delta.size else np.nan
+            loss = np.maximum(-delta, 0).mean() if delta.size else np.nan
             
             # 避免除零錯誤
-            rs = gain / loss.replace(0, np.nan)
-            df['RSI'] = 100 - (100 / (1 + rs))
+            rsi = 100 - (100 / (1 + gain / loss)) if loss > 0 else np.nan
             
             # MACD
-            ema12 = df['Close'].ewm(span=12, min_periods=1).mean()
-            ema26 = df['Close'].ewm(span=26, min_periods=1).mean()
-            df['MACD'] = ema12 - ema26
-            df['MACD_Signal'] = df['MACD'].ewm(span=9, min_periods=1).mean()
+            macd = _ema(close, 12)
+            macd -= _ema(close, 26)
+            macd_signal = _ema(macd, 9)[-1]
+            
+            latest = {
+                'ma20': ma20,
+                'ma60': ma60,
+                'rsi': rsi,
+                'macd': macd[-1],
+                'macd_signal': macd_signal
+            }
             
-            # 布林帶
-            df['BB_Middle'] = df['Close'].rolling(window=20, min_periods=1).mean()
-            bb_std = df['Close'].rolling(window=20, min_periods=1).std()
-            df['BB_Upper'] = df['BB_Middle'] + (bb_std * 2)
-            df['BB_Lower'] = df['BB_Middle'] - (bb_std * 2)
+            # NaN（自身不相等）轉為None
+            indicators = {key: float(value) if value == value else None for key, value in latest.items()}
             
-            return df
+            # 年化波動率 - 共用同一收盤價陣列
+            indicators['volatility'] = _annualized_volatility(close)
+            
+            # 區間報酬率
+            performance = {
+                period: float((close[-1] / close[-1 - lookback] - 1) * 100) if close.size > lookback else 0
+                for period, lookback in (('1d', 1), ('1w', 5), ('1m', 20), ('3m', 62))
+            }
+            performance['1y'] = float((close[-1] / close[0] - 1) * 100) if close.size >= 252 else 0
+            indicators['performance'] = performance
+            
+            return indicators
             
         except Exception as e:
             logger.error(f"Error calculating technical indicators: {e}")
-            return df
+            return {}
     
     def get_market_overview(self) -> Optional[Dict]:
         """獲取市場概況"""
         cache_key = "market_overview"
-        if self._is_cache_valid(cache_key):
+        cached = self._get_cached(cache_key)
+        if cached is not None:
             logger.info("Using cached market overview")
-            return self.cache[cache_key]
+            return cached
         
+        return self._fetch_coalesced(cache_key, lambda: self._fetch_fresh_market_overview(cache_key))
+    
+    def _fetch_fresh_market_overview(self, cache_key: str) -> Optional[Dict]:
+        """向上游獲取市場概況並更新緩存"""
         try:
             logger.info("Fetching fresh market overview")
             
             # 獲取台股加權指數
-            taiex = yf.Ticker("^TWII")
-            taiex_data = taiex.history(period="5d")
+            self._rate_limit("^TWII")
+            taiex = self._get_ticker("^TWII")
+            taiex_data = taiex.history(period="5d", actions=False)
             
             if taiex_data.empty:
                 logger.warning("No TAIEX data available")
                 return None
             
-            current_price = float(taiex_data['Close'].iloc[-1])
-            prev_price = float(taiex_data['Close'].iloc[-2]) if len(taiex_data) >= 2 else current_price
+            close = taiex_data['Close'].dropna().to_numpy(dtype=np.float64)
+            current_price = float(close[-1])
+            prev_price = float(close[-2]) if close.size >= 2 else current_price
             change_pct = (current_price / prev_price - 1) * 100 if prev_price != 0 else 0
             
             # 計算波動率
-            volatility = float(taiex_data['Close'].pct_change().std() * (252**0.5))
+            volatility = _annualized_volatility(close)
             
             # 判斷趨勢
-            if change_pct > 1:
-                trend = 'strong_up'
-                trend_desc = '強勢上漲'
-            elif change_pct > 0:
-                trend = 'up'
-                trend_desc = '溫和上漲'
-            elif change_pct > -1:
-                trend = 'sideways'
-                trend_desc = '橫盤整理'
-            else:
-                trend = 'down'
-                trend_desc = '下跌趨勢'
+            trend, trend_desc = TRENDS[bisect_left(TREND_CHANGE_BOUNDS, change_pct)]
             
             market_data = {
                 'index_value': current_price,
@@ -230,7 +613,7 @@ class ImprovedDataFetcher:
             }
             
             # 更新緩存
-            self.cache[cache_key] = market_data
+            self._set_cache(cache_key, market_data)
             logger.info("Successfully fetched and cached market overview")
             
             return market_data
@@ -242,29 +625,52 @@ class ImprovedDataFetcher:
     def get_batch_etf_data(self, symbols: List[str]) -> Dict[str, Dict]:
         """批量獲取ETF數據"""
         results = {}
+        pending = []
         
         for symbol in symbols:
+            cached = self._get_cached(self._cache_key(symbol))
+            if cached is not None:
+                results[symbol] = cached
+            else:
+                pending.append(symbol)
+        
+        if not pending:
+            return results
+        
+        # 每檔各自取得令牌並經由共用session與限流重試獲取，於執行緒池並行執行
+        # 已有其他請求在獲取的代碼直接等待其結果；登記在呼叫端完成，池內執行緒不需等待其他請求
+        # 整批共用一個重試期限，限流時不會逐檔累加等待而超過worker逾時
+        deadline = time.monotonic() + BATCH_RETRY_DEADLINE
+        futures = {}
+        for symbol in pending:
+            cache_key = self._cache_key(symbol)
+            future, is_owner = self._claim_inflight(cache_key)
+            if is_owner:
+                fetch = partial(self._fetch_fresh_etf_data, symbol, cache_key, batch=True, deadline=deadline)
+                self.executor.submit(self._run_inflight, cache_key, future, fetch)
+            futures[symbol] = future
+        
+        for symbol, future in futures.items():
             try:
-                data = self.fetch_etf_data(symbol)
+                data = future.result()
                 if data:
                     results[symbol] = data
-                    
-                # 添加延遲避免請求過於頻繁
-                time.sleep(0.5)
-                
             except Exception as e:
                 logger.error(f"Error in batch fetch for {symbol}: {e}")
-                continue
+        
+        # 本批新取得的靜態資訊統一寫檔一次
+        self._save_static_info()
         
         return results
     
     def get_etf_historical_data(self, symbol: str, period: str = "1y") -> Optional[pd.DataFrame]:
         """獲取ETF歷史數據"""
         try:
-            ticker_symbol = f"{symbol}.TW"
-            ticker = yf.Ticker(ticker_symbol)
+            self._rate_limit(symbol)
             
-            hist = ticker.history(period=period)
+            ticker = self._get_ticker(f"{symbol}.TW")
+            
+            hist = self._history_with_retry(ticker, symbol, period=period)
             
             if hist.empty:
                 logger.warning(f"No historical data for {symbol}")
@@ -276,17 +682,35 @@ class ImprovedDataFetcher:
             logger.error(f"Error fetching historical data for {symbol}: {e}")
             return None
     
-    def _is_cache_valid(self, key: str) -> bool:
-        """檢查緩存是否有效"""
-        if key not in self.cache:
-            return False
-        
-        data = self.cache[key]
-        if 'last_updated' not in data:
-            return False
+    def _get_cached(self, key: str) -> Optional[Dict]:
+        """讀取未過期的緩存，過期或不存在時返回None"""
+        data = self.cache.get(key)
+        if data is None:
+            # 記憶體未命中時改讀磁碟緩存，到期時間由數據更新時間推算
+            data = self.persistent_cache.get(key)
+            if data is None or 'last_updated' not in data:
+                return None
+            self.cache_expires[key] = data['last_updated'].timestamp() + self.cache_ttl
+            self.cache[key] = data
         
-        time_diff = datetime.now() - data['last_updated']
-        return time_diff.seconds < self.cache_ttl
+        if self.cache_expires.get(key, 0) > time.time():
+            return data
+        return None
+    
+    def _cache_key(self, symbol: str) -> str:
+        """取得ETF緩存鍵，已知代碼重用預先建立的字串（雜湊值已緩存）"""
+        entry = self.etf_index.get(symbol)
+        return entry['cache_key'] if entry else f"etf_{symbol}"
+    
+    def _lock_for(self, key: str) -> threading.Lock:
+        """取得key對應的分片鎖"""
+        return self.cache_locks[hash(key) & 15]
+    
+    def _set_cache(self, key: str, value: Dict):
+        """寫入記憶體與磁碟緩存"""
+        self.cache_expires[key] = time.time() + self.cache_ttl
+        self.cache[key] = value
+        self.persistent_cache.set(key, value)
     
     def _rate_limit(self, symbol: str):
         """請求頻率限制"""
@@ -300,10 +724,15 @@ class ImprovedDataFetcher:
                 time.sleep(sleep_time)
         
         self.last_request_time[symbol] = current_time
+        
+        # 全域令牌桶限流
+        self.rate_limiter.acquire()
     
     def clear_cache(self):
         """清除緩存"""
         self.cache.clear()
+        self.cache_expires.clear()
+        self.persistent_cache.clear()
         logger.info("Cache cleared")
     
     def get_cache_status(self) -> Dict:
@@ -316,17 +745,12 @@ class ImprovedDataFetcher:
     
     def validate_etf_symbol(self, symbol: str) -> bool:
         """驗證ETF代碼是否有效"""
-        for category in self.etf_list.values():
-            if symbol in category:
-                return True
-        return False
+        return symbol in self.etf_index
     
     def get_etf_category(self, symbol: str) -> Optional[str]:
         """獲取ETF分類"""
-        for category_name, etfs in self.etf_list.items():
-            if symbol in etfs:
-                return category_name
-        return None
+        entry = self.etf_index.get(symbol)
+        return entry['category'] if entry else None
     
     def search_etf(self, query: str) -> List[Dict]:
         """搜索ETF"""
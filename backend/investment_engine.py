@@ -1,11 +1,42 @@
-import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
 import logging
-from typing import Dict, List, Optional
+import heapq
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# 市場環境評分查表 - 漲跌幅超過各門檻（不含）即進入下一級
+MARKET_CHANGE_BOUNDS = (-2, 0, 2)
+MARKET_SCORES = (30, 50, 65, 80)  # 下跌趨勢、橫盤整理、溫和上漲、強勢上漲
+
+# ETF風險等級
+ETF_RISK_LEVELS = {
+    '0050': '中', '006208': '中',      # 大盤ETF
+    '0056': '低', '00878': '低',       # 高股息ETF
+    '0051': '高', '00762': '高',       # 中小型ETF
+    '0052': '高', '00881': '高',       # 科技ETF
+    '00679B': '低', '00687B': '低',    # 債券ETF
+    '00712': '中', '01001': '中'       # REITs ETF
+}
+
+# 風險等級分數
+RISK_LEVEL_SCORES = {'低': 1, '中': 2, '高': 3}
+
+# 投資組合風險等級查表 - 加權風險分數超過各門檻（不含）即進入下一級
+PORTFOLIO_RISK_BOUNDS = (1.5, 2.5)
+PORTFOLIO_RISK_LEVELS = ('低', '中', '高')
+
+# ETF特性描述
+ETF_DESCRIPTIONS = {
+    '0050': '追蹤台灣50指數，市場代表性強',
+    '006208': '追蹤台灣50指數，費用率較低',
+    '0056': '高股息策略，提供穩定現金流',
+    '00878': '國泰永續高股息，ESG概念',
+    '0052': '科技類ETF，參與科技成長趨勢',
+    '00881': '國泰台灣5G+，5G概念投資'
+}
+
 class ImprovedInvestmentEngine:
     """升級後的投資引擎"""
     
@@ -27,14 +58,13 @@ class ImprovedInvestmentEngine:
             'sell': 25           # 從35降到25
         }
         
-        # ETF分類 - 清理後的清單
+        # 推薦等級查表 - 依門檻由低到高排列，以二分搜尋取代逐級比較
+        self.recommendation_levels = ('sell', 'hold', 'buy', 'strong_buy')
+        self.recommendation_bounds = [self.score_thresholds[level] for level in self.recommendation_levels[1:]]
+        
+        # ETF分類 - 直接取自數據獲取器的清單，避免維護兩份副本
         self.etf_categories = {
-            'large_cap': ['0050', '006208'],
-            'dividend': ['0056', '00878', '00713'],
-            'tech': ['0052', '00881'],
-            'mid_small': ['0051', '00762'],
-            'bond': ['00679B', '00687B'],
-            'reit': ['00712', '01001']
+            category: list(etfs) for category, etfs in data_fetcher.get_etf_list().items()
         }
     
     def generate_investment_advice(self, user_profile: Dict) -> Dict:
@@ -45,8 +75,11 @@ class ImprovedInvestmentEngine:
             # 獲取市場環境
             market_condition = self._assess_market_condition()
             
+            # 批量獲取所有ETF數據，評分與生成建議共用同一份
+            all_etf_data = self._get_all_etf_data()
+            
             # 獲取所有ETF評分
-            etf_scores = self._get_all_etf_scores()
+            etf_scores = self._get_all_etf_scores(all_etf_data)
             
             # 篩選推薦ETF
             recommended_etfs = self._select_recommended_etfs(etf_scores)
@@ -60,15 +93,17 @@ class ImprovedInvestmentEngine:
             
             # 生成詳細建議
             recommendations = self._generate_detailed_recommendations(
-                allocation, etf_scores
+                allocation, etf_scores, all_etf_data
             )
             
+            total_expected_return, risk_level = self._summarize_portfolio(recommendations)
+            
             return {
                 'success': True,
                 'market_condition': market_condition,
                 'recommendations': recommendations,
-                'total_expected_return': self._calculate_portfolio_expected_return(recommendations),
-                'risk_level': self._assess_portfolio_risk_level(recommendations),
+                'total_expected_return': total_expected_return,
+                'risk_level': risk_level,
                 'generated_at': datetime.now().isoformat()
             }
             
@@ -101,21 +136,27 @@ class ImprovedInvestmentEngine:
             logger.error(f"Error assessing market condition: {e}")
             return 'neutral'
     
-    def _get_all_etf_scores(self) -> Dict:
-        """獲取所有ETF評分"""
-        etf_scores = {}
-        
+    def _get_all_etf_data(self) -> Dict[str, Dict]:
+        """批量獲取所有ETF數據"""
         # 獲取所有ETF代碼
         all_etfs = []
         for category_etfs in self.etf_categories.values():
             all_etfs.extend(category_etfs)
         
-        for symbol in all_etfs:
+        # 批量獲取數據，減少請求次數
+        return self.data_fetcher.get_batch_etf_data(all_etfs)
+    
+    def _get_all_etf_scores(self, all_etf_data: Dict[str, Dict]) -> Dict:
+        """獲取所有ETF評分"""
+        etf_scores = {}
+        
+        # 市場環境評分與個別ETF無關，每輪只計算一次
+        market_score = self._calculate_market_score()
+        
+        for symbol, etf_data in all_etf_data.items():
             try:
-                etf_data = self.data_fetcher.fetch_etf_data(symbol)
-                if etf_data:
-                    score = self._calculate_etf_score(etf_data)
-                    etf_scores[symbol] = score
+                score = self._calculate_etf_score(etf_data, market_score)
+                etf_scores[symbol] = score
                     
             except Exception as e:
                 logger.error(f"Error scoring ETF {symbol}: {e}")
@@ -123,7 +164,7 @@ class ImprovedInvestmentEngine:
         
         return etf_scores
     
-    def _calculate_etf_score(self, etf_data: Dict) -> Dict:
+    def _calculate_etf_score(self, etf_data: Dict, market_score: float) -> Dict:
         """計算ETF評分"""
         try:
             # 基本面評分
@@ -132,9 +173,6 @@ class ImprovedInvestmentEngine:
             # 技術面評分
             technical_score = self._calculate_technical_score(etf_data)
             
-            # 市場環境評分
-            market_score = self._calculate_market_score()
-            
             # 綜合評分
             total_score = (
                 fundamental_score * self.factor_weights['fundamental'] +
@@ -269,14 +307,7 @@ class ImprovedInvestmentEngine:
             change_pct = market_data.get('change_percent', 0)
             
             # 市場趨勢評分
-            if change_pct > 2:
-                return 80  # 強勢上漲
-            elif change_pct > 0:
-                return 65  # 溫和上漲
-            elif change_pct > -2:
-                return 50  # 橫盤整理
-            else:
-                return 30  # 下跌趨勢
+            return MARKET_SCORES[bisect_left(MARKET_CHANGE_BOUNDS, change_pct)]
                 
         except Exception as e:
             logger.error(f"Error in market score calculation: {e}")
@@ -284,14 +315,10 @@ class ImprovedInvestmentEngine:
     
     def _get_recommendation(self, score: float) -> str:
         """根據評分獲取推薦等級"""
-        if score >= self.score_thresholds['strong_buy']:
-            return 'strong_buy'
-        elif score >= self.score_thresholds['buy']:
-            return 'buy'
-        elif score >= self.score_thresholds['hold']:
-            return 'hold'
-        else:
-            return 'sell'
+        # NaN與任何門檻比較皆為False，查表會落入最高級，改為最低級
+        if score != score:
+            return self.recommendation_levels[0]
+        return self.recommendation_levels[bisect_right(self.recommendation_bounds, score)]
     
     def _select_recommended_etfs(self, etf_scores: Dict) -> List[str]:
         """選擇推薦ETF"""
@@ -302,23 +329,16 @@ class ImprovedInvestmentEngine:
         ]
         
         if not buy_etfs:
-            # 如果沒有達到買入標準的ETF，選擇評分最高的3個
-            sorted_etfs = sorted(
-                etf_scores.items(), 
-                key=lambda x: x[1]['total_score'], 
-                reverse=True
-            )
-            buy_etfs = [etf for etf, _ in sorted_etfs[:3]]
+            # 如果沒有達到買入標準的ETF，選擇評分最高的3個（只取前3名，不需完整排序）
+            buy_etfs = heapq.nlargest(3, etf_scores, key=lambda etf: etf_scores[etf]['total_score'])
         
         return buy_etfs
     
     def _calculate_allocation(self, recommended_etfs: List[str], 
                            available_funds: float, risk_level: str) -> Dict:
         """計算資金配置"""
-        allocation = {}
-        
         if not recommended_etfs:
-            return allocation
+            return {}
         
         # 根據風險等級調整配置
         if risk_level == 'conservative':
@@ -338,19 +358,16 @@ class ImprovedInvestmentEngine:
         # 平均分配，但不超過單一ETF上限
         base_allocation = min(stock_funds / etf_count, available_funds * max_single_etf)
         
-        for etf in recommended_etfs:
-            allocation[etf] = base_allocation
-        
-        return allocation
+        return dict.fromkeys(recommended_etfs, base_allocation)
     
     def _generate_detailed_recommendations(self, allocation: Dict, 
-                                         etf_scores: Dict) -> List[Dict]:
+                                         etf_scores: Dict, all_etf_data: Dict[str, Dict]) -> List[Dict]:
         """生成詳細投資建議"""
         recommendations = []
         
         for etf, amount in allocation.items():
             try:
-                etf_data = self.data_fetcher.fetch_etf_data(etf)
+                etf_data = all_etf_data.get(etf)
                 if not etf_data:
                     continue
                 
@@ -363,16 +380,17 @@ class ImprovedInvestmentEngine:
                 actual_amount = shares * current_price
                 
                 if shares > 0:
+                    score_data = etf_scores.get(etf, {})
                     recommendation = {
                         'etf': etf,
                         'etf_name': etf_data.get('name', etf),
                         'target_amount': actual_amount,
                         'shares': shares,
                         'current_price': current_price,
-                        'expected_return': self._estimate_expected_return(etf, etf_scores.get(etf, {})),
+                        'expected_return': self._estimate_expected_return(etf, score_data),
                         'risk_level': self._assess_etf_risk_level(etf),
-                        'reason': self._get_investment_reason(etf, etf_scores.get(etf, {})),
-                        'score': etf_scores.get(etf, {}).get('total_score', 0)
+                        'reason': self._get_investment_reason(etf, score_data),
+                        'score': score_data.get('total_score', 0)
                     }
                     recommendations.append(recommendation)
                     
@@ -398,16 +416,7 @@ class ImprovedInvestmentEngine:
     
     def _assess_etf_risk_level(self, etf: str) -> str:
         """評估ETF風險等級"""
-        risk_mapping = {
-            '0050': '中', '006208': '中',      # 大盤ETF
-            '0056': '低', '00878': '低',       # 高股息ETF
-            '0051': '高', '00762': '高',       # 中小型ETF
-            '0052': '高', '00881': '高',       # 科技ETF
-            '00679B': '低', '00687B': '低',    # 債券ETF
-            '00712': '中', '01001': '中'       # REITs ETF
-        }
-        
-        return risk_mapping.get(etf, '中')
+        return ETF_RISK_LEVELS.get(etf, '中')
     
     def _get_investment_reason(self, etf: str, score_data: Dict) -> str:
         """獲取投資理由"""
@@ -428,57 +437,28 @@ class ImprovedInvestmentEngine:
             reasons.append("相對表現較佳")
         
         # ETF特性描述
-        etf_descriptions = {
-            '0050': '追蹤台灣50指數，市場代表性強',
-            '006208': '追蹤台灣50指數，費用率較低',
-            '0056': '高股息策略，提供穩定現金流',
-            '00878': '國泰永續高股息，ESG概念',
-            '0052': '科技類ETF，參與科技成長趨勢',
-            '00881': '國泰台灣5G+，5G概念投資'
-        }
-        
-        description = etf_descriptions.get(etf, '優質ETF標的')
+        description = ETF_DESCRIPTIONS.get(etf, '優質ETF標的')
         
         return f"{description}，{' '.join(reasons)}"
     
-    def _calculate_portfolio_expected_return(self, recommendations: List[Dict]) -> float:
-        """計算投資組合預期報酬"""
-        if not recommendations:
-            return 0
-        
-        total_amount = sum(rec['target_amount'] for rec in recommendations)
-        if total_amount == 0:
-            return 0
-        
-        weighted_return = sum(
-            rec['target_amount'] * rec['expected_return'] 
-            for rec in recommendations
-        ) / total_amount
-        
-        return weighted_return
-    
-    def _assess_portfolio_risk_level(self, recommendations: List[Dict]) -> str:
-        """評估投資組合風險等級"""
-        if not recommendations:
-            return '低'
-        
-        risk_scores = {'低': 1, '中': 2, '高': 3}
-        total_amount = sum(rec['target_amount'] for rec in recommendations)
+    def _summarize_portfolio(self, recommendations: List[Dict]) -> Tuple[float, str]:
+        """單次走訪計算投資組合預期報酬與風險等級"""
+        total_amount = 0
+        weighted_return = 0
+        weighted_risk = 0
+        
+        for rec in recommendations:
+            amount = rec['target_amount']
+            total_amount += amount
+            weighted_return += amount * rec['expected_return']
+            weighted_risk += amount * RISK_LEVEL_SCORES.get(rec['risk_level'], 2)
         
         if total_amount == 0:
-            return '低'
+            return 0, '低'
         
-        weighted_risk = sum(
-            rec['target_amount'] * risk_scores.get(rec['risk_level'], 2)
-            for rec in recommendations
-        ) / total_amount
+        risk_level = PORTFOLIO_RISK_LEVELS[bisect_left(PORTFOLIO_RISK_BOUNDS, weighted_risk / total_amount)]
         
-        if weighted_risk <= 1.5:
-            return '低'
-        elif weighted_risk <= 2.5:
-            return '中'
-        else:
-            return '高'
+        return weighted_return / total_amount, risk_level
     
     def run_backtest(self, start_date: str, end_date: str, 
                     initial_funds: float) -> Dict:
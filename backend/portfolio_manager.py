@@ -4,21 +4,44 @@ from datetime import datetime, timedelta
 import logging
 from typing import Dict, List, Optional
 
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
 logger = logging.getLogger(__name__)
 
+# ETF類別對應的資產類型
+CATEGORY_ASSET_TYPES = {
+    'large_cap': 'stock',
+    'tech': 'stock',
+    'mid_small': 'stock',
+    'dividend': 'stock',
+    'bond': 'bond',
+    'reit': 'reit'
+}
+
 class PortfolioManager:
     """投資組合管理器"""
     
-    def __init__(self, data_file: str = "portfolios.json"):
+    def __init__(self, data_file: str = "portfolios.json", data_fetcher=None):
         self.data_file = data_file
+        self.data_fetcher = data_fetcher
         self.portfolios = self._load_portfolios()
     
+    def _get_data_fetcher(self):
+        """獲取共用的數據獲取器"""
+        if self.data_fetcher is None:
+            from data_fetcher import ImprovedDataFetcher
+            self.data_fetcher = ImprovedDataFetcher()
+        return self.data_fetcher
+    
     def _load_portfolios(self) -> Dict:
         """載入投資組合數據"""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                with open(self.data_file, 'rb') as f:
+                    return _json_loads(f.read())
             else:
                 return {}
         except Exception as e:
@@ -207,8 +230,7 @@ class PortfolioManager:
     def _update_portfolio_values(self, portfolio: Dict):
         """更新投資組合價值"""
         try:
-            from data_fetcher import ImprovedDataFetcher
-            data_fetcher = ImprovedDataFetcher()
+            data_fetcher = self._get_data_fetcher()
             
             total_value = portfolio.get('cash_balance', 0)
             
@@ -331,8 +353,7 @@ class PortfolioManager:
                     'diversification_score': 0
                 }
             
-            from data_fetcher import ImprovedDataFetcher
-            data_fetcher = ImprovedDataFetcher()
+            data_fetcher = self._get_data_fetcher()
             
             # 按類別分組
             category_allocation = {}
@@ -353,12 +374,9 @@ class PortfolioManager:
                     category_allocation[category] += weight
                     
                     # 映射到資產類型
-                    if category in ['large_cap', 'tech', 'mid_small', 'dividend']:
-                        asset_type_allocation['stock'] += weight
-                    elif category == 'bond':
-                        asset_type_allocation['bond'] += weight
-                    elif category == 'reit':
-                        asset_type_allocation['reit'] += weight
+                    asset_type = CATEGORY_ASSET_TYPES.get(category)
+                    if asset_type:
+                        asset_type_allocation[asset_type] += weight
             
             # 現金比例
             if total_value > 0:
@@ -1,11 +1,15 @@
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
 import logging
-from typing import Dict, List, Optional
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# 整體風險等級查表 - 分數達到各門檻即進入下一級
+OVERALL_RISK_BOUNDS = (30, 60)
+OVERALL_RISK_LEVELS = ('low', 'medium', 'high')
+
 class RiskManager:
     """風險管理器"""
     
@@ -29,6 +33,14 @@ class RiskManager:
             'medium': {'volatility': 0.20, 'max_drawdown': 0.12},
             'high': {'volatility': 0.30, 'max_drawdown': 0.20}
         }
+        
+        # 各風險因子權重
+        self.risk_factor_weights = {
+            'concentration': 0.3,
+            'volatility': 0.3,
+            'correlation': 0.2,
+            'sector': 0.2
+        }
     
     def assess_portfolio_risk(self, portfolio: Dict) -> Dict:
         """評估投資組合風險"""
@@ -152,15 +164,7 @@ class RiskManager:
         portfolio_volatility = np.average(volatilities, weights=weights)
         
         # 計算風險分數
-        if portfolio_volatility > self.risk_thresholds['max_portfolio_volatility']:
-            score = min(100, (portfolio_volatility - self.risk_thresholds['max_portfolio_volatility']) * 400)
-            level = 'high'
-        elif portfolio_volatility > 0.15:
-            score = (portfolio_volatility - 0.15) / 0.10 * 50 + 30
-            level = 'medium'
-        else:
-            score = portfolio_volatility / 0.15 * 30
-            level = 'low'
+        score, level = self._score_volatility(portfolio_volatility)
         
         return {
             'score': score,
@@ -172,6 +176,17 @@ class RiskManager:
             }
         }
     
+    def _score_volatility(self, volatility: float) -> Tuple[float, str]:
+        """將波動率轉換為風險分數與等級"""
+        threshold = self.risk_thresholds['max_portfolio_volatility']
+        
+        if volatility > threshold:
+            return min(100, (volatility - threshold) * 400), 'high'
+        elif volatility > 0.15:
+            return (volatility - 0.15) / 0.10 * 50 + 30, 'medium'
+        else:
+            return volatility / 0.15 * 30, 'low'
+    
     def _assess_correlation_risk(self, holdings: List[Dict]) -> Dict:
         """評估相關性風險"""
         if len(holdings) < 2:
@@ -270,13 +285,7 @@ class RiskManager:
                                     volatility_risk: Dict, correlation_risk: Dict, 
                                     sector_risk: Dict) -> float:
         """計算整體風險分數"""
-        # 各風險因子權重
-        weights = {
-            'concentration': 0.3,
-            'volatility': 0.3,
-            'correlation': 0.2,
-            'sector': 0.2
-        }
+        weights = self.risk_factor_weights
         
         overall_score = (
             concentration_risk['score'] * weights['concentration'] +
@@ -289,12 +298,7 @@ class RiskManager:
     
     def _determine_overall_risk_level(self, risk_score: float) -> str:
         """確定整體風險等級"""
-        if risk_score < 30:
-            return 'low'
-        elif risk_score < 60:
-            return 'medium'
-        else:
-            return 'high'
+        return OVERALL_RISK_LEVELS[bisect_right(OVERALL_RISK_BOUNDS, risk_score)]
     
     def _generate_risk_warnings(self, concentration_risk: Dict, volatility_risk: Dict,
                               correlation_risk: Dict, sector_risk: Dict) -> List[str]:
@@ -498,12 +502,7 @@ class RiskManager:
             )
             
             # 確定風險等級
-            if risk_score < 30:
-                overall_risk = 'low'
-            elif risk_score < 60:
-                overall_risk = 'medium'
-            else:
-                overall_risk = 'high'
+            overall_risk = self._determine_overall_risk_level(risk_score)
             
             # 生成警告
             warnings = []
@@ -604,15 +603,7 @@ class RiskManager:
             avg_volatility = np.mean(volatilities)
         
         # 計算波動率風險分數
-        if avg_volatility > 0.25:
-            score = min(100, (avg_volatility - 0.25) * 400)
-            level = 'high'
-        elif avg_volatility > 0.15:
-            score = (avg_volatility - 0.15) / 0.10 * 50 + 30
-            level = 'medium'
-        else:
-            score = avg_volatility / 0.15 * 30
-            level = 'low'
+        score, level = self._score_volatility(avg_volatility)
         
         return {
             'score': score,
@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# 測試直接匯入backend下的模組
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_fetcher import ImprovedDataFetcher
+
+
+@pytest.fixture
+def fetcher(tmp_path):
+    """使用暫存目錄存放靜態資訊與緩存的數據獲取器"""
+    return ImprovedDataFetcher(
+        static_info_file=str(tmp_path / "etf_static_info.json"),
+        cache_file=str(tmp_path / "etf_cache.db")
+    )
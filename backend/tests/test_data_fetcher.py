@@ -0,0 +1,122 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_fetcher
+from data_fetcher import TokenBucket
+
+
+def _history(close):
+    """構建yfinance格式的日線歷史數據"""
+    index = pd.date_range("2024-01-01", periods=len(close), freq="B")
+    return pd.DataFrame({'Close': close, 'Volume': np.full(len(close), 1000.0)}, index=index)
+
+
+def test_build_etf_data_skips_leading_nan(fetcher):
+    close = 100 + np.sin(np.arange(120) / 5) * 5
+    hist = _history(np.concatenate(([np.nan], close)))
+
+    data = fetcher._build_etf_data('0050', {}, hist)
+    price_data = data['price_data']
+
+    expected = pd.Series(close)
+    macd = expected.ewm(span=12, min_periods=1).mean() - expected.ewm(span=26, min_periods=1).mean()
+    assert math.isclose(price_data['ma60'], close[-60:].mean())
+    assert math.isclose(price_data['macd'], macd.iloc[-1])
+    assert math.isclose(price_data['macd_signal'], macd.ewm(span=9, min_periods=1).mean().iloc[-1])
+    assert math.isfinite(price_data['volatility'])
+
+
+class _Ticker:
+    """記錄history()呼叫次數的Ticker"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def history(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return _history(np.linspace(100, 110, 30))
+
+
+def _fake_tickers(fetcher, monkeypatch, symbols, delay=0.0):
+    """以假Ticker取代共用session的Ticker，並使用不等待的限流器"""
+    tickers = {f"{symbol}.TW": _Ticker(delay) for symbol in symbols}
+    monkeypatch.setattr(fetcher, '_get_ticker', tickers.__getitem__)
+    fetcher.rate_limiter = TokenBucket(rate=1000.0, capacity=100)
+    fetcher.static_info.update({symbol: {'updated_at': time.time()} for symbol in symbols})
+    return tickers
+
+
+def test_batch_fetch_requests_each_symbol_once(fetcher, monkeypatch):
+    symbols = ['0050', '0056', '00878']
+    tickers = _fake_tickers(fetcher, monkeypatch, symbols)
+
+    results = fetcher.get_batch_etf_data(symbols)
+
+    assert sorted(results) == sorted(symbols)
+    assert all(ticker.calls == 1 for ticker in tickers.values())
+    assert all(math.isclose(data['current_price'], 110) for data in results.values())
+
+
+def test_concurrent_batches_share_in_flight_fetches(fetcher, monkeypatch):
+    symbols = ['0050', '0056', '00878']
+    tickers = _fake_tickers(fetcher, monkeypatch, symbols, delay=0.05)
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        batches = list(pool.map(fetcher.get_batch_etf_data, [symbols, symbols]))
+
+    assert all(sorted(results) == sorted(symbols) for results in batches)
+    assert all(ticker.calls == 1 for ticker in tickers.values())
+
+
+class _ThrottledTicker:
+    """第一次請求模擬被限流：回應hook暫停限流器，history()返回空表"""
+
+    def __init__(self, rate_limiter, throttled=True):
+        self.rate_limiter = rate_limiter
+        self.throttled = throttled
+        self.calls = 0
+
+    def history(self, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            if self.throttled:
+                self.rate_limiter.pause(0.01)
+            return pd.DataFrame()
+        return _history(np.linspace(100, 110, 30))
+
+
+def test_history_retries_empty_frame_while_throttled(fetcher, monkeypatch):
+    monkeypatch.setattr(data_fetcher.random, 'uniform', lambda a, b: 0)
+    fetcher.rate_limiter = TokenBucket(rate=100.0, capacity=5)
+    ticker = _ThrottledTicker(fetcher.rate_limiter)
+
+    hist = fetcher._history_with_retry(ticker, '0050', period="1y")
+
+    assert ticker.calls == 2
+    assert not hist.empty
+
+
+def test_history_returns_empty_frame_when_not_throttled(fetcher):
+    fetcher.rate_limiter = TokenBucket(rate=100.0, capacity=5)
+    ticker = _ThrottledTicker(fetcher.rate_limiter, throttled=False)
+
+    hist = fetcher._history_with_retry(ticker, '0050', period="1y")
+
+    assert ticker.calls == 1
+    assert hist.empty
+
+
+def test_history_does_not_retry_past_deadline(fetcher):
+    fetcher.rate_limiter = TokenBucket(rate=100.0, capacity=5)
+    ticker = _ThrottledTicker(fetcher.rate_limiter)
+
+    hist = fetcher._history_with_retry(ticker, '0050', time.monotonic(), period="1y")
+
+    assert ticker.calls == 1
+    assert hist.empty
@@ -0,0 +1,8 @@
+from investment_engine import ImprovedInvestmentEngine
+
+
+def test_nan_score_maps_to_sell(fetcher):
+    engine = ImprovedInvestmentEngine(fetcher)
+
+    assert engine._get_recommendation(float('nan')) == 'sell'
+    assert engine._get_recommendation(100) == 'strong_buy'